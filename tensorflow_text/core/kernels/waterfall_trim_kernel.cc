@@ -0,0 +1,89 @@
+// Copyright 2021 TF.Text Authors.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <algorithm>
+
+#include "tensorflow/core/framework/op_kernel.h"
+#include "tensorflow/core/framework/register_types.h"
+#include "tensorflow/core/framework/tensor.h"
+#include "tensorflow/core/framework/tensor_shape.h"
+#include "tensorflow/core/framework/tensor_types.h"
+#include "tensorflow/core/lib/core/errors.h"
+#include "tensorflow/core/platform/macros.h"
+
+namespace tensorflow {
+namespace text {
+
+// Computes the waterfall allocation of a per-row budget in a single pass over
+// the [batch_size, num_segments] row lengths. This replaces the chain of
+// cumsum/minimum/maximum ops (and the intermediate tensors they materialize)
+// that would otherwise be needed to compute the same allocation.
+template <typename T>
+class WaterfallTrimMaskOp : public OpKernel {
+ public:
+  explicit WaterfallTrimMaskOp(OpKernelConstruction* ctx) : OpKernel(ctx) {}
+
+  void Compute(OpKernelContext* ctx) override {
+    const Tensor& segment_row_lengths = ctx->input(0);
+    const Tensor& budget = ctx->input(1);
+
+    OP_REQUIRES(ctx, TensorShapeUtils::IsMatrix(segment_row_lengths.shape()),
+                errors::InvalidArgument(
+                    "segment_row_lengths must be a matrix, but got shape: ",
+                    segment_row_lengths.shape().DebugString()));
+    const int64 batch_size = segment_row_lengths.dim_size(0);
+    const int64 num_segments = segment_row_lengths.dim_size(1);
+
+    // A single budget is broadcasted and applied to every batch row.
+    const bool broadcast_budget = budget.NumElements() == 1;
+    OP_REQUIRES(ctx, broadcast_budget || budget.NumElements() == batch_size,
+                errors::InvalidArgument(
+                    "budget must have either 1 or batch_size=", batch_size,
+                    " elements, but got shape: ",
+                    budget.shape().DebugString()));
+
+    Tensor* keep_counts_tensor;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("keep_counts",
+                                             segment_row_lengths.shape(),
+                                             &keep_counts_tensor));
+
+    const auto lengths = segment_row_lengths.matrix<T>();
+    const auto budget_flat = budget.flat<T>();
+    auto keep_counts = keep_counts_tensor->matrix<T>();
+    for (int64 b = 0; b < batch_size; ++b) {
+      T remaining = std::max(budget_flat(broadcast_budget ? 0 : b), T(0));
+      for (int64 s = 0; s < num_segments; ++s) {
+        const T take = std::min(std::max(lengths(b, s), T(0)), remaining);
+        keep_counts(b, s) = take;
+        remaining -= take;
+      }
+    }
+  }
+
+ private:
+  TF_DISALLOW_COPY_AND_ASSIGN(WaterfallTrimMaskOp);
+};
+
+#define REGISTER(T)                                       \
+  REGISTER_KERNEL_BUILDER(Name("WaterfallTrimMask")       \
+                              .Device(DEVICE_CPU)         \
+                              .TypeConstraint<T>("T"),    \
+                          WaterfallTrimMaskOp<T>);
+
+TF_CALL_int32(REGISTER);
+TF_CALL_int64(REGISTER);
+#undef REGISTER
+
+}  // namespace text
+}  // namespace tensorflow
@@ -0,0 +1,84 @@
+// Copyright 2021 TF.Text Authors.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <gmock/gmock.h>
+#include <gtest/gtest.h>
+#include "tensorflow/core/framework/fake_input.h"
+#include "tensorflow/core/framework/node_def_builder.h"
+#include "tensorflow/core/framework/shape_inference_testutil.h"
+#include "tensorflow/core/framework/tensor.h"
+#include "tensorflow/core/framework/tensor_shape.h"
+#include "tensorflow/core/framework/tensor_testutil.h"
+#include "tensorflow/core/kernels/ops_testutil.h"
+#include "tensorflow/core/lib/core/status_test_util.h"
+
+namespace tensorflow {
+namespace text {
+
+using tensorflow::FakeInput;
+using tensorflow::NodeDefBuilder;
+using tensorflow::TensorShape;
+
+class WaterfallTrimMaskKernelTest : public tensorflow::OpsTestBase {
+ public:
+  void MakeOp() {
+    TF_ASSERT_OK(NodeDefBuilder("tested_op", "WaterfallTrimMask")
+                     .Input(FakeInput(DT_INT32))
+                     .Input(FakeInput(DT_INT32))
+                     .Finalize(node_def()));
+    TF_ASSERT_OK(InitOp());
+  }
+};
+
+TEST_F(WaterfallTrimMaskKernelTest, ScalarBudget) {
+  MakeOp();
+  AddInputFromArray<int32>(TensorShape({2, 3}), {3, 4, 2, 1, 1, 1});
+  AddInputFromArray<int32>(TensorShape({}), {5});
+  TF_ASSERT_OK(RunOpKernel());
+
+  Tensor expected(DT_INT32, TensorShape({2, 3}));
+  test::FillValues<int32>(&expected, {3, 2, 0, 1, 1, 1});
+  test::ExpectTensorEqual<int32>(expected, *GetOutput(0));
+}
+
+TEST_F(WaterfallTrimMaskKernelTest, PerBatchBudget) {
+  MakeOp();
+  AddInputFromArray<int32>(TensorShape({3, 2}), {3, 1, 2, 1, 1, 3});
+  AddInputFromArray<int32>(TensorShape({3, 1}), {2, 1, 3});
+  TF_ASSERT_OK(RunOpKernel());
+
+  Tensor expected(DT_INT32, TensorShape({3, 2}));
+  test::FillValues<int32>(&expected, {2, 0, 1, 0, 1, 2});
+  test::ExpectTensorEqual<int32>(expected, *GetOutput(0));
+}
+
+TEST_F(WaterfallTrimMaskKernelTest, BudgetSizeMismatch) {
+  MakeOp();
+  AddInputFromArray<int32>(TensorShape({3, 2}), {3, 1, 2, 1, 1, 3});
+  AddInputFromArray<int32>(TensorShape({2}), {2, 1});
+  EXPECT_FALSE(RunOpKernel().ok());
+}
+
+TEST(WaterfallTrimMaskOpTest, ShapeFn) {
+  ShapeInferenceTestOp op("WaterfallTrimMask");
+
+  INFER_OK(op, "[3,2];[]", "in0");
+  INFER_OK(op, "[3,2];[3]", "in0");
+  INFER_OK(op, "[?,?];[?,1]", "in0");
+  INFER_OK(op, "?;?", "[?,?]");
+  INFER_ERROR("Shape must be rank 2 but is rank 1", op, "[3];[]");
+}
+
+}  // namespace text
+}  // namespace tensorflow
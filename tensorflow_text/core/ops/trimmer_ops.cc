@@ -0,0 +1,57 @@
+// Copyright 2021 TF.Text Authors.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "tensorflow/core/framework/op.h"
+#include "tensorflow/core/framework/shape_inference.h"
+
+namespace tensorflow {
+namespace text {
+
+using shape_inference::InferenceContext;
+using shape_inference::ShapeHandle;
+
+REGISTER_OP("WaterfallTrimMask")
+    .Input("segment_row_lengths: T")
+    .Input("budget: T")
+    .Output("keep_counts: T")
+    .Attr("T: {int32, int64} = DT_INT32")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle segment_row_lengths;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 2, &segment_row_lengths));
+      c->set_output(0, segment_row_lengths);
+      return Status::OK();
+    })
+    .Doc(R"doc(
+Allocates a length budget to segments using a waterfall strategy.
+
+For every batch row, the budget is handed out to the segments in order. Each
+segment keeps as many of its items as the remaining budget allows, and whatever
+it keeps is deducted from the budget before moving on to the next segment. For
+example, a budget of 5 over segments of lengths [3, 4, 2] is allocated as
+[3, 2, 0].
+
+The result holds the number of leading items to keep in each segment, i.e. a
+row-wise item is kept iff its position within the row is less than the
+corresponding value in `keep_counts`.
+
+segment_row_lengths: a 2D Tensor of shape [batch_size, num_segments] with the
+  number of items in each segment of each batch row.
+budget: a Tensor with either a single element, which is applied to every batch
+  row, or with `batch_size` elements holding the budget of each batch row.
+keep_counts: a 2D Tensor of shape [batch_size, num_segments] with the number of
+  leading items to keep in each segment of each batch row.
+)doc");
+
+}  // namespace text
+}  // namespace tensorflow
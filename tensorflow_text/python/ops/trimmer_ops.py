@@ -15,14 +15,30 @@
 
 """Library of ops to truncate segments."""
 import abc
+import functools
+import weakref
 
+import numpy as np
+
+from tensorflow.python.eager import context
+from tensorflow.python.eager import def_function
+from tensorflow.python.framework import device_spec
 from tensorflow.python.framework import dtypes
+from tensorflow.python.framework import errors
 from tensorflow.python.framework import ops
+from tensorflow.python.framework import tensor_shape
+from tensorflow.python.framework import tensor_spec
 from tensorflow.python.ops import array_ops
 from tensorflow.python.ops import math_ops
+from tensorflow.python.ops import sort_ops
 from tensorflow.python.ops.ragged import ragged_array_ops
+from tensorflow.python.ops.ragged import ragged_math_ops
 from tensorflow.python.ops.ragged import ragged_tensor
-from tensorflow_text.python.ops import item_selector_ops
+
+# pylint: disable=g-bad-import-order
+from tensorflow.python.framework import load_library
+from tensorflow.python.platform import resource_loader
+gen_trimmer_ops = load_library.load_op_library(resource_loader.get_path_to_datafile('_trimmer_ops.so'))
 
 
 class Trimmer(object):
@@ -76,14 +92,342 @@ class Trimmer(object):
     raise NotImplementedError()
 
 
+# Row lengths already computed for an eager segment, keyed on (id(segments),
+# axis). Entries hold a weak reference to their segment and are evicted once
+# the segment is garbage collected.
+_ROW_LENGTHS_CACHE = {}
+
+
 def _get_row_lengths(segments, axis=-1):
+  """Get the number of items along `axis` in each batch row of `segments`.
+
+  When executing eagerly, the result is memoized per segment, so trimming the
+  same segments more than once (e.g. with different trimmers) only computes
+  the reduction once. Graph tensors are not memoized, since they may not be
+  usable from another control flow or control dependency context.
+
+  Args:
+    segments: A `RaggedTensor` w/ a shape of [num_batch, (num_items)].
+    axis: Axis to count the items on.
+
+  Returns:
+    a `Tensor` w/ a shape of [num_batch].
+  """
   axis = array_ops.get_positive_axis(axis, segments.shape.ndims) - 1
-  foo = ragged_tensor.RaggedTensor.from_nested_row_lengths(
-      segments.nested_row_lengths()[axis],
-      segments.nested_row_lengths()[:axis])
-  for _ in range(axis):
-    foo = math_ops.reduce_sum(foo, -1)
-  return foo
+  memoize = context.executing_eagerly()
+  cache_key = (id(segments), axis)
+  cached = _ROW_LENGTHS_CACHE.get(cache_key) if memoize else None
+  if cached is not None and cached[0]() is segments:
+    return cached[1]
+
+  nested_row_lengths = segments.nested_row_lengths()
+  row_lengths = ragged_tensor.RaggedTensor.from_nested_row_lengths(
+      nested_row_lengths[axis], nested_row_lengths[:axis])
+  if axis:
+    row_lengths = math_ops.reduce_sum(row_lengths, list(range(1, axis + 1)))
+
+  if memoize:
+    _ROW_LENGTHS_CACHE[cache_key] = (
+        weakref.ref(segments,
+                    lambda _: _ROW_LENGTHS_CACHE.pop(cache_key, None)),
+        row_lengths)
+  return row_lengths
+
+
+def _compute_stacked_row_lengths(segments, axis=-1):
+  """Computes the number of items along `axis` in each row of each segment.
+
+  The result can be passed to the `generate_mask()` method of the trimmers in
+  this module as `_precomputed_row_lengths`, so that several trimmers applied
+  to the same segments, with the same `axis`, can share it.
+
+  Args:
+    segments: A list of `RaggedTensor` each w/ a shape of [num_batch,
+      (num_items)].
+    axis: Axis to count the items on.
+
+  Returns:
+    a `Tensor` w/ a shape of [num_batch, len(segments)].
+  """
+  return array_ops.stack([_get_row_lengths(s, axis) for s in segments],
+                         axis=-1)
+
+
+def _get_static_budget(max_seq_length):
+  """Returns `max_seq_length` if it is a non-negative python int, else None."""
+  if isinstance(max_seq_length, int) and max_seq_length >= 0:
+    return max_seq_length
+  return None
+
+
+def _waterfall_allocate(segment_lengths, budget):
+  """Allocates `budget` to segments in order, filling up each one in turn.
+
+  Args:
+    segment_lengths: A `Tensor` w/ a shape of [num_batch, num_segments] with
+      the number of items in each row of each segment.
+    budget: A `Tensor` with either a single element or one element per batch
+      row, holding the max number of items to keep in each row.
+
+  Returns:
+    an int32 `Tensor` w/ a shape of [num_batch, num_segments] with the number
+    of leading items to keep in each row of each segment.
+  """
+  # A single fused kernel does the allocation in one pass over the lengths.
+  return gen_trimmer_ops.waterfall_trim_mask(
+      math_ops.cast(segment_lengths, dtypes.int32),
+      math_ops.cast(budget, dtypes.int32))
+
+
+def _round_robin_allocate(segment_lengths, budget, num_segments):
+  """Allocates `budget` to segments one item at a time, in turns.
+
+  Each round hands one more item to every segment that still has items left,
+  visiting the segments left-to-right, until the budget runs out. Rather than
+  simulating the rounds, the allocation is computed in closed form: segments
+  that fit within an equal share of the budget are kept whole, the others
+  split what is left evenly and any remainder goes, one item each, to the
+  leftmost of them.
+
+  Args:
+    segment_lengths: An int32 `Tensor` w/ a shape of [num_batch, num_segments]
+      with the number of items in each row of each segment.
+    budget: An int32 `Tensor` broadcastable to [num_batch, 1] with the max
+      number of items to keep in each row.
+    num_segments: The number of segments, as a python int.
+
+  Returns:
+    an int32 `Tensor` w/ a shape of [num_batch, num_segments] with the number
+    of leading items to keep in each row of each segment.
+  """
+  # Visit the segments from shortest to longest. The segment at rank `r` is
+  # kept whole iff it fits within an equal share of the budget left over by
+  # the shorter ones, split among the `num_segments - r` unvisited segments.
+  sorted_lengths = sort_ops.sort(segment_lengths, axis=-1)
+  leftover_budget = budget - math_ops.cumsum(
+      sorted_lengths, exclusive=True, axis=-1)
+  num_unvisited = math_ops.range(num_segments, 0, -1)
+  is_whole = sorted_lengths * num_unvisited <= leftover_budget
+  whole_lengths = math_ops.reduce_sum(
+      array_ops.where_v2(is_whole, sorted_lengths, 0), axis=-1, keepdims=True)
+  num_partial = num_segments - math_ops.reduce_sum(
+      math_ops.cast(is_whole, dtypes.int32), axis=-1, keepdims=True)
+
+  # Split what the whole segments left evenly among the partial ones. Whole
+  # segments are never longer than that share, so they are told apart by
+  # their length alone.
+  partial_budget = budget - whole_lengths
+  divisor = math_ops.maximum(num_partial, 1)
+  share = math_ops.floordiv(partial_budget, divisor)
+  remainder = math_ops.floormod(partial_budget, divisor)
+  is_partial = math_ops.logical_and(segment_lengths > share, num_partial > 0)
+
+  # Hand out the remainder to the leftmost partial segments
+  partial_rank = math_ops.cumsum(
+      math_ops.cast(is_partial, dtypes.int32), exclusive=True, axis=-1)
+  gets_extra = math_ops.logical_and(is_partial, partial_rank < remainder)
+  return (array_ops.where_v2(is_partial, share, segment_lengths) +
+          math_ops.cast(gets_extra, dtypes.int32))
+
+
+@functools.lru_cache(maxsize=16)
+def _get_round_robin_allocate_fn(num_segments):
+  """Returns `_round_robin_allocate` specialized for `num_segments`.
+
+  The allocation is traced once per number of segments, with an input
+  signature that leaves the batch size unknown, so that its graph is built a
+  single time and reused for every batch.
+
+  Args:
+    num_segments: The number of segments, as a python int.
+
+  Returns:
+    a `tf.function` taking `segment_lengths` and `budget` as described in
+    `_round_robin_allocate()`, with `budget` shaped as [num_batch or 1, 1].
+  """
+  return def_function.function(
+      functools.partial(_round_robin_allocate, num_segments=num_segments),
+      input_signature=[
+          tensor_spec.TensorSpec([None, num_segments], dtypes.int32),
+          tensor_spec.TensorSpec([None, 1], dtypes.int32),
+      ])
+
+
+def _wrap_masks(segments, flat_masks, axis=-1):
+  """Wraps the flat mask of each segment in that segment's row partitions.
+
+  Args:
+    segments: A list of `RaggedTensor` each w/ a shape of [num_batch,
+      (num_items)].
+    flat_masks: A list with len(segments) of flat boolean masks, where the i-th
+      item has one value per item of `segments[i]` along `axis`.
+    axis: Axis to apply trimming on.
+
+  Returns:
+    a list with len(segments) of boolean `RaggedTensor`s, where the i-th item
+    has the shape `segments[i].shape[:axis + 1]` and reuses the row splits of
+    `segments[i]`.
+  """
+  masks = []
+  for segment, flat_mask in zip(segments, flat_masks):
+    segment_axis = array_ops.get_positive_axis(axis, segment.shape.ndims)
+    masks.append(
+        ragged_tensor.RaggedTensor.from_nested_row_splits(
+            flat_mask, segment.nested_row_splits[:segment_axis],
+            validate=False))
+  return masks
+
+
+def _first_n_mask_batched(segments, segment_row_lengths, keep_counts, axis=-1):
+  """Builds masks that keep the first `keep_counts` items of each segment.
+
+  Instead of building a separate selection graph per segment, the row lengths
+  of all the segments are flattened into a single batch, so that the position
+  of every item is computed and compared against its keep count only once. The
+  flat result is then split back into one mask per segment.
+
+  Args:
+    segments: A list of `RaggedTensor` each w/ a shape of [num_batch,
+      (num_items)].
+    segment_row_lengths: A `Tensor` w/ a shape of [num_batch, len(segments)]
+      with the number of items along `axis` in each row of each segment.
+    keep_counts: A `Tensor` w/ a shape of [num_batch, len(segments)] with the
+      number of leading items to keep in each row of each segment.
+    axis: Axis to apply trimming on.
+
+  Returns:
+    a list with len(segments) of boolean `RaggedTensor`s, where the i-th item
+    has the shape `segments[i].shape[:axis + 1]` and reuses the row splits of
+    `segments[i]`.
+  """
+  # Flatten to [len(segments) * num_batch] rows, ordered segment by segment.
+  row_lengths = array_ops.reshape(
+      array_ops.transpose(segment_row_lengths), [-1])
+  keep_counts = math_ops.cast(
+      array_ops.reshape(array_ops.transpose(keep_counts), [-1]),
+      row_lengths.dtype)
+  # Item `j` of a row is kept iff `j < keep_count`, which only needs the flat
+  # positions and the keep counts repeated once per item.
+  positions = ragged_math_ops.range(row_lengths).flat_values
+  mask_flat = positions < array_ops.repeat(keep_counts, row_lengths)
+
+  # Split the flat mask back into the shape of each segment, with a single op.
+  sizes = math_ops.reduce_sum(segment_row_lengths, axis=0)
+  flat_masks = array_ops.split(mask_flat, sizes, num=len(segments))
+  return _wrap_masks(segments, flat_masks, axis)
+
+
+def _is_eager_on_cpu(segments):
+  """Returns True if the row partitions of all `segments` are eager on CPU."""
+  for segment in segments:
+    row_splits = segment.row_splits
+    if not isinstance(row_splits, ops.EagerTensor):
+      return False
+    device = device_spec.DeviceSpecV2.from_string(row_splits.device)
+    if device.device_type != "CPU":
+      return False
+  return True
+
+
+def _waterfall_mask_numpy(segments, row_lengths, budget, axis=-1):
+  """Computes `WaterfallTrimmer.generate_mask()` for eager segments in NumPy.
+
+  For small eager inputs, dispatching the ops that allocate the budget and
+  build the masks one at a time costs far more than the integer math itself.
+  Here, that math is done in NumPy, leaving a single op per segment to wrap its
+  flat mask in a `RaggedTensor`.
+
+  Args:
+    segments: A list of eager `RaggedTensor` each w/ a shape of [num_batch,
+      (num_items)].
+    row_lengths: A numpy array w/ a shape of [len(segments), num_batch] with
+      the number of items along `axis` in each row of each segment.
+    budget: A numpy array with either a single element or one element per
+      batch row, holding the max number of items to keep in each row.
+    axis: Axis to apply trimming on.
+
+  Returns:
+    a list with len(segments) of boolean `RaggedTensor`s, where the i-th item
+    has the shape `segments[i].shape[:axis + 1]` and reuses the row splits of
+    `segments[i]`.
+
+  Raises:
+    InvalidArgumentError: if `budget` has neither 1 nor num_batch elements, as
+      `WaterfallTrimMask` does.
+  """
+  num_batch = row_lengths.shape[1]
+  if budget.size not in (1, num_batch):
+    raise errors.InvalidArgumentError(
+        None, None,
+        "budget must have either 1 or batch_size=%d elements, but got shape: "
+        "[%s]" % (num_batch, ",".join(str(d) for d in budget.shape)))
+
+  # Each segment keeps as much as the segments before it left of the budget.
+  taken = np.cumsum(row_lengths, axis=0) - row_lengths
+  keep_counts = np.minimum(
+      row_lengths, np.maximum(np.reshape(budget, [-1]) - taken, 0))
+
+  # Item `j` of a row is kept iff `j < keep_count`.
+  flat_lengths = row_lengths.ravel()
+  row_starts = np.cumsum(flat_lengths) - flat_lengths
+  positions = (np.arange(flat_lengths.sum()) -
+               np.repeat(row_starts, flat_lengths))
+  mask_flat = positions < np.repeat(keep_counts.ravel(), flat_lengths)
+
+  # Split the flat mask back into the shape of each segment.
+  flat_masks = np.split(mask_flat, np.cumsum(row_lengths.sum(axis=1))[:-1])
+  return _wrap_masks(segments, flat_masks, axis)
+
+
+def _trim_batch(segments, budgets, allocate, axis=-1):
+  """Trims `segments` once for each of `budgets`, see `trim_batch()`.
+
+  Args:
+    segments: A list of `RaggedTensor`s w/ shape [num_batch, (num_items)].
+    budgets: An int `Tensor` w/ a shape of [num_budgets] or [num_budgets,
+      num_batch], where `num_budgets` is statically known.
+    allocate: The `_allocate()` method of the trimmer to trim with.
+    axis: Axis to apply trimming on.
+
+  Returns:
+    a list with num_budgets items, where the i-th item is the list of trimmed
+    segments for a budget of `budgets[i]`.
+
+  Raises:
+    ValueError: if the number of budgets is not statically known.
+  """
+  with ops.name_scope("Trimmer/TrimBatch"):
+    segments = [ragged_tensor.convert_to_tensor_or_ragged_tensor(s)
+                for s in segments]
+    budgets = ops.convert_to_tensor(budgets)
+    num_budgets = tensor_shape.dimension_value(
+        budgets.shape.with_rank_at_least(1)[0])
+    if num_budgets is None:
+      raise ValueError("The number of budgets must be statically known.")
+    segment_row_lengths = _compute_stacked_row_lengths(segments, axis)
+    num_batch = array_ops.shape(segment_row_lengths)[0]
+
+    # Repeat the batch once per budget, so that a single allocation over
+    # [num_budgets * num_batch] rows covers all of the budgets.
+    tiled_row_lengths = array_ops.tile(segment_row_lengths, [num_budgets, 1])
+    tiled_budgets = array_ops.reshape(
+        array_ops.broadcast_to(
+            array_ops.reshape(budgets, [num_budgets, -1]),
+            [num_budgets, num_batch]), [-1])
+    keep_counts = array_ops.reshape(
+        allocate(tiled_row_lengths, tiled_budgets),
+        [num_budgets, -1, len(segments)])
+
+    results = []
+    for i in range(num_budgets):
+      masks = _first_n_mask_batched(segments, segment_row_lengths,
+                                    keep_counts[i], axis)
+      results.append([
+          ragged_array_ops.boolean_mask(
+              seg, mask.with_row_splits_dtype(seg.row_splits.dtype))
+          for seg, mask in zip(segments, masks)
+      ])
+    return results
 
 
 class WaterfallTrimmer(Trimmer):
@@ -108,7 +452,52 @@ class WaterfallTrimmer(Trimmer):
     self._max_seq_length = max_seq_length
     self._axis = axis
 
-  def generate_mask(self, segments):
+  def trim_batch(self, segments, budgets):
+    """Truncate the list of `segments` once for each of `budgets`.
+
+    This is equivalent to trimming `segments` with a separate `WaterfallTrimmer`
+    for each budget, but the allocation of every budget is computed in a single
+    pass over the row lengths of `segments`.
+
+    Args:
+      segments: A list of `RaggedTensor`s w/ shape [num_batch, (num_items)].
+      budgets: An int `Tensor` w/ a shape of [num_budgets] or [num_budgets,
+        num_batch] with the max number of items to keep in each (or every)
+        batch row, for each budget. `num_budgets` must be statically known.
+
+    Returns:
+      a list with num_budgets items, where the i-th item is the list that
+      `trim()` returns for a trimmer with a budget of `budgets[i]`.
+
+    Raises:
+      NotImplementedError: if a subclass overrides `generate_mask()` but not
+        `_allocate()`.
+      ValueError: if the number of budgets is not statically known.
+    """
+    if (type(self).generate_mask is not WaterfallTrimmer.generate_mask and
+        type(self)._allocate is WaterfallTrimmer._allocate):
+      raise NotImplementedError(
+          "%s overrides `generate_mask()` but not `_allocate()`, which "
+          "`trim_batch()` uses instead." % type(self).__name__)
+    return _trim_batch(segments, budgets, self._allocate, self._axis)
+
+  def _allocate(self, segment_row_lengths, budget):
+    """Allocates a budget to the items of each row of the segments.
+
+    Args:
+      segment_row_lengths: A `Tensor` w/ a shape of [num_rows, num_segments]
+        with the number of items in each row of each segment.
+      budget: A `Tensor` w/ a shape of [num_rows] with the max number of items
+        to keep in each row.
+
+    Returns:
+      an int32 `Tensor` w/ a shape of [num_rows, num_segments] with the number
+      of leading items to keep in each row of each segment, as allocated by
+      `generate_mask()`.
+    """
+    return _waterfall_allocate(segment_row_lengths, budget)
+
+  def generate_mask(self, segments, _precomputed_row_lengths=None):
     """Calculates a truncation mask given a per-batch budget.
 
     Calculate a truncation mask given a budget of the max number of items for
@@ -127,36 +516,41 @@ class WaterfallTrimmer(Trimmer):
     Args:
       segments: A list of `RaggedTensor` each w/ a shape of [num_batch,
         (num_items)].
+      _precomputed_row_lengths: (optional) For internal use. A `Tensor` w/ a
+        shape of [num_batch, len(segments)] as returned by
+        `_compute_stacked_row_lengths(segments, self._axis)`, to use instead
+        of computing the row lengths of `segments` again.
     Returns:
       a list with len(segments) of `RaggedTensor`s, see superclass for details.
     """
     with ops.name_scope("WaterfallTrimmer/generate_mask"):
-      segment_row_lengths = [_get_row_lengths(s, self._axis) for s in segments]
-      segment_row_lengths = array_ops.stack(segment_row_lengths, axis=-1)
-
-      # Broadcast budget to match the rank of segments[0]
+      # Eager inputs on CPU are trimmed in NumPy, without dispatching an op
+      # for each step.
       budget = ops.convert_to_tensor(self._max_seq_length)
-      for _ in range(segments[0].shape.ndims - budget.shape.ndims):
-        budget = array_ops.expand_dims(budget, -1)
-
-      # Compute the allocation for each segment using a `waterfall` algorithm
-      segment_lengths = math_ops.cast(segment_row_lengths, dtypes.int32)
-      budget = math_ops.cast(budget, dtypes.int32)
-      leftover_budget = math_ops.cumsum(
-          -1 * segment_lengths, exclusive=False, axis=-1) + budget
-      leftover_budget = segment_lengths + math_ops.minimum(leftover_budget, 0)
-      results = math_ops.maximum(leftover_budget, 0)
+      if isinstance(budget, ops.EagerTensor) and _is_eager_on_cpu(segments):
+        if _precomputed_row_lengths is None:
+          row_lengths = np.stack(
+              [_get_row_lengths(s, self._axis).numpy() for s in segments])
+        else:
+          row_lengths = np.transpose(np.asarray(_precomputed_row_lengths))
+        return _waterfall_mask_numpy(segments, row_lengths, budget.numpy(),
+                                     self._axis)
+
+      if _precomputed_row_lengths is None:
+        segment_row_lengths = _compute_stacked_row_lengths(
+            segments, self._axis)
+      else:
+        segment_row_lengths = ops.convert_to_tensor(_precomputed_row_lengths)
+
+      # Compute the allocation for each segment using a `waterfall` algorithm.
+      # The kernel takes a budget w/ either a single element or one element
+      # per batch row, in any shape.
+      results = _waterfall_allocate(segment_row_lengths, budget)
 
       # Translate the results into boolean masks that match the shape of each
       # segment
-      results = array_ops.unstack(results, axis=-1)
-      item_selectors = [
-          item_selector_ops.FirstNItemSelector(i) for i in results
-      ]
-      return [
-          i.get_selectable(s, self._axis)
-          for s, i in zip(segments, item_selectors)
-      ]
+      return _first_n_mask_batched(segments, segment_row_lengths, results,
+                                   self._axis)
 
 
 class RoundRobinTrimmer(Trimmer):
@@ -171,14 +565,66 @@ class RoundRobinTrimmer(Trimmer):
     """Creates an instance of `RoundRobinTrimmer`.
 
     Args:
-      max_seq_length: a scalar `Tensor` int32 that describes the number max
-        number of elements allowed in a batch.
+      max_seq_length: a scalar `Tensor` or a 1D `Tensor` of type int32 that
+        describes the number max number of elements allowed in a batch. If a
+        scalar is provided, the value is broadcasted and applied to all values
+        across the batch.
       axis: Axis to apply trimming on.
     """
     self._max_seq_length = max_seq_length
     self._axis = axis
+    self._static_budget = _get_static_budget(max_seq_length)
+
+  def trim_batch(self, segments, budgets):
+    """Truncate the list of `segments` once for each of `budgets`.
 
-  def generate_mask(self, segments):
+    This is equivalent to trimming `segments` with a separate
+    `RoundRobinTrimmer` for each budget, but the allocation of every budget is
+    computed in a single pass over the row lengths of `segments`.
+
+    Args:
+      segments: A list of `RaggedTensor`s w/ shape [num_batch, (num_items)].
+      budgets: An int `Tensor` w/ a shape of [num_budgets] or [num_budgets,
+        num_batch] with the max number of items to keep in each (or every)
+        batch row, for each budget. `num_budgets` must be statically known.
+
+    Returns:
+      a list with num_budgets items, where the i-th item is the list that
+      `trim()` returns for a trimmer with a budget of `budgets[i]`.
+
+    Raises:
+      NotImplementedError: if a subclass overrides `generate_mask()` but not
+        `_allocate()`.
+      ValueError: if the number of budgets is not statically known.
+    """
+    if (type(self).generate_mask is not RoundRobinTrimmer.generate_mask and
+        type(self)._allocate is RoundRobinTrimmer._allocate):
+      raise NotImplementedError(
+          "%s overrides `generate_mask()` but not `_allocate()`, which "
+          "`trim_batch()` uses instead." % type(self).__name__)
+    return _trim_batch(segments, budgets, self._allocate, self._axis)
+
+  def _allocate(self, segment_row_lengths, budget):
+    """Allocates a budget to the items of each row of the segments.
+
+    Args:
+      segment_row_lengths: A `Tensor` w/ a shape of [num_rows, num_segments]
+        with the number of items in each row of each segment.
+      budget: A `Tensor` w/ a shape of [num_rows] with the max number of items
+        to keep in each row.
+
+    Returns:
+      an int32 `Tensor` w/ a shape of [num_rows, num_segments] with the number
+      of leading items to keep in each row of each segment, as allocated by
+      `generate_mask()`.
+    """
+    round_robin_allocate = _get_round_robin_allocate_fn(
+        segment_row_lengths.shape.as_list()[-1])
+    return round_robin_allocate(
+        math_ops.cast(segment_row_lengths, dtypes.int32),
+        math_ops.cast(array_ops.reshape(budget, [-1, 1]), dtypes.int32))
+
+  def generate_mask(self, segments, _precomputed_row_lengths=None):
     """Calculates a truncation mask given a per-batch budget.
 
     Calculate a truncation mask given a budget of the max number of items for
@@ -192,53 +638,39 @@ class RoundRobinTrimmer(Trimmer):
     Args:
       segments: A list of `RaggedTensor` each w/ a shape of [num_batch,
         (num_items)].
+      _precomputed_row_lengths: (optional) For internal use. A `Tensor` w/ a
+        shape of [num_batch, len(segments)] as returned by
+        `_compute_stacked_row_lengths(segments, self._axis)`, to use instead
+        of computing the row lengths of `segments` again.
 
     Returns:
       a list with len(segments) of `RaggedTensor`s, see superclass for details.
     """
     with ops.name_scope("RoundRobinTrimmer/generate_mask"):
-      segment_row_lengths = [_get_row_lengths(s, self._axis) for s in segments]
-      segment_row_lengths = array_ops.stack(segment_row_lengths, axis=-1)
+      if _precomputed_row_lengths is None:
+        segment_row_lengths = _compute_stacked_row_lengths(
+            segments, self._axis)
+      else:
+        segment_row_lengths = ops.convert_to_tensor(_precomputed_row_lengths)
+
+      # Canonicalize a scalar or per-batch `budget` into a [num_batch or 1, 1]
+      # column, which the allocation math broadcasts against the row lengths.
+      # A static budget is passed as a python constant of that shape.
+      if self._static_budget is not None:
+        budget = [[self._static_budget]]
+      else:
+        budget = ops.convert_to_tensor(self._max_seq_length)
+        budget = math_ops.cast(
+            array_ops.reshape(budget, [-1, 1]), dtypes.int32)
+
+      # Compute the allocation for each segment using a `round robin`
+      # algorithm. It runs in int32; the keep counts are cast back to the
+      # dtype of the row lengths when building the masks.
+      round_robin_allocate = _get_round_robin_allocate_fn(len(segments))
+      results = round_robin_allocate(
+          math_ops.cast(segment_row_lengths, dtypes.int32), budget)
 
-      budget = ops.convert_to_tensor(self._max_seq_length)
-      # Broadcast and make `budget` match the shape of `segment_row_lengths`
-      budget = budget + math_ops.cast(0 * segment_row_lengths, dtypes.int32)
-
-      # Take the budget and equally distribute it among all the segments.
-      budget_per_segment = math_ops.cast(budget / len(segments), dtypes.int32)
-      budget_per_segment = math_ops.cast(budget_per_segment, dtypes.int64)
-
-      # Figure out the min num of elements per segment
-      min_row_length = math_ops.reduce_min(segment_row_lengths, axis=-1)
-      for _ in range(segment_row_lengths.shape.ndims -
-                     min_row_length.shape.ndims):
-        min_row_length = array_ops.expand_dims(min_row_length, -1)
-
-      # We either deduct the min across a row, or the equally distributed budget
-      socialism = math_ops.minimum(min_row_length, budget_per_segment)
-      leftover_segment_lengths = segment_row_lengths - socialism
-
-      # Update the new budget w/ everyone's equal share removed
-      budget = budget - math_ops.cast(socialism * len(segments), dtypes.int32)
-      segment_row_lengths = leftover_segment_lengths
-
-      # Compute the remaining allocation for each segment using a `waterfall`
-      # algorithm
-      segment_lengths = math_ops.cast(segment_row_lengths, dtypes.int32)
-      budget = math_ops.cast(budget, dtypes.int32)
-      leftover_budget = math_ops.cumsum(
-          -1 * segment_lengths, exclusive=False, axis=-1) + budget
-      leftover_budget = segment_lengths + math_ops.minimum(leftover_budget, 0)
-      results = math_ops.maximum(leftover_budget, 0)
-      results = results + math_ops.cast(socialism, dtypes.int32)
       # Translate the results into boolean masks that match the shape of each
       # segment
-      results = array_ops.unstack(results, axis=-1)
-
-      item_selectors = [
-          item_selector_ops.FirstNItemSelector(i) for i in results
-      ]
-      return [
-          i.get_selectable(s, self._axis)
-          for s, i in zip(segments, item_selectors)
-      ]
+      return _first_n_mask_batched(segments, segment_row_lengths, results,
+                                   self._axis)
@@ -14,10 +14,17 @@
 # limitations under the License.
 
 """Tests for ops to trim segments."""
+import gc
+
 from absl.testing import parameterized
 
+from tensorflow.python.eager import context
+from tensorflow.python.eager import def_function
 from tensorflow.python.framework import constant_op
+from tensorflow.python.framework import errors
+from tensorflow.python.framework import ops
 from tensorflow.python.framework import test_util
+from tensorflow.python.ops import variables
 from tensorflow.python.ops.ragged import ragged_factory_ops
 from tensorflow.python.platform import test
 from tensorflow_text.python.ops import trimmer_ops
@@ -58,6 +65,26 @@ class WaterfallTrimmerOpsTest(test.TestCase, parameterized.TestCase):
           ],
           max_seq_length=[2, 1, 3],
       ),
+      dict(
+          descr="Test with more than two segments",
+          segments=[
+              # segment 1
+              [[1, 2, 3], [4]],
+              # segment 2
+              [[5, 6], [7, 8, 9]],
+              # segment 3
+              [[10], [11, 12]],
+          ],
+          expected=[
+              # segment 1
+              [[True, True, True], [True]],
+              # segment 2
+              [[True, True], [True, True, True]],
+              # segment 3
+              [[False], [True, False]],
+          ],
+          max_seq_length=5,
+      ),
       dict(
           segments=[
               # first segment
@@ -213,6 +240,136 @@ class WaterfallTrimmerOpsTest(test.TestCase, parameterized.TestCase):
     for expected_seg, actual_seg in zip(expected, actual):
       self.assertAllEqual(expected_seg, actual_seg)
 
+  def testTrimSameSegmentsTwice(self):
+    segments = [
+        ragged_factory_ops.constant([[[1, 2], [3]], [[4]]]),
+        ragged_factory_ops.constant([[[5]], [[6, 7], [8]]]),
+    ]
+    waterfall = trimmer_ops.WaterfallTrimmer(2).trim(segments)
+    round_robin = trimmer_ops.RoundRobinTrimmer(2).trim(segments)
+    self.assertAllEqual(waterfall[0], [[[1, 2], []], [[4]]])
+    self.assertAllEqual(waterfall[1], [[[]], [[6], []]])
+    self.assertAllEqual(round_robin[0], [[[1], []], [[4]]])
+    self.assertAllEqual(round_robin[1], [[[5]], [[6], []]])
+
+  def testBudgetMustMatchBatchSize(self):
+    segments = [ragged_factory_ops.constant([[1, 2], [3]])]
+    trimmer = trimmer_ops.WaterfallTrimmer([1, 2, 3])
+    with self.assertRaisesRegex(errors.InvalidArgumentError,
+                                "budget must have either 1 or batch_size=2"):
+      self.evaluate(trimmer.generate_mask(segments))
+
+  def testRowLengthsAreMemoizedEagerly(self):
+    segment = ragged_factory_ops.constant([[[1, 2], [3]], [[4]]])
+    num_cached = len(trimmer_ops._ROW_LENGTHS_CACHE)
+    row_lengths = trimmer_ops._get_row_lengths(segment, axis=-1)
+    self.assertAllEqual(row_lengths, [3, 1])
+    if context.executing_eagerly():
+      self.assertIs(trimmer_ops._get_row_lengths(segment, axis=-1),
+                    row_lengths)
+    else:
+      self.assertIsNot(trimmer_ops._get_row_lengths(segment, axis=-1),
+                       row_lengths)
+    del segment, row_lengths
+    gc.collect()
+    self.assertLen(trimmer_ops._ROW_LENGTHS_CACHE, num_cached)
+
+  @parameterized.parameters([
+      dict(max_seq_length=[2, 3]),
+      dict(max_seq_length=[-1, 4]),
+      dict(max_seq_length=-2),
+      dict(max_seq_length=2, axis=-2),
+      dict(max_seq_length=[1, 3], axis=-2),
+  ])
+  def testEagerNumpyPathMatchesGraphPath(self, max_seq_length, axis=-1):
+    if not context.executing_eagerly():
+      self.skipTest("The NumPy path only runs eagerly.")
+    segments = [
+        ragged_factory_ops.constant([[[1, 2], [3]], [[4], [5, 6], [7]]]),
+        ragged_factory_ops.constant([[[8]], [[9, 10], [11]]]),
+    ]
+    self.assertTrue(trimmer_ops._is_eager_on_cpu(segments))
+    trimmer = trimmer_ops.WaterfallTrimmer(max_seq_length, axis=axis)
+    expected = def_function.function(trimmer.generate_mask)(segments)
+    actual = trimmer.generate_mask(segments)
+    for expected_mask, actual_mask in zip(expected, actual):
+      self.assertAllEqual(expected_mask, actual_mask)
+
+  def testVariableBudget(self):
+    segments = [
+        ragged_factory_ops.constant([[1, 2, 3]]),
+        ragged_factory_ops.constant([[4, 5]]),
+    ]
+    budget = variables.Variable(1)
+    self.evaluate(budget.initializer)
+    waterfall = trimmer_ops.WaterfallTrimmer(budget)
+    round_robin = trimmer_ops.RoundRobinTrimmer(budget)
+    self.assertAllEqual(waterfall.trim(segments)[0], [[1]])
+    self.assertAllEqual(round_robin.trim(segments)[1], [[]])
+    self.evaluate(budget.assign(3))
+    self.assertAllEqual(waterfall.trim(segments)[0], [[1, 2, 3]])
+    self.assertAllEqual(round_robin.trim(segments)[1], [[4]])
+
+  def testTrimInAnotherGraph(self):
+    waterfall = trimmer_ops.WaterfallTrimmer([1, 3])
+    round_robin = trimmer_ops.RoundRobinTrimmer(2)
+    with ops.Graph().as_default() as graph:
+      segments = [
+          ragged_factory_ops.constant([[1, 2], [3, 4]]),
+          ragged_factory_ops.constant([[5], [6, 7]]),
+      ]
+      waterfall_segments = waterfall.trim(segments)
+      round_robin_segments = round_robin.trim(segments)
+      with self.session(graph=graph):
+        self.assertAllEqual(waterfall_segments[0], [[1], [3, 4]])
+        self.assertAllEqual(waterfall_segments[1], [[], [6]])
+        self.assertAllEqual(round_robin_segments[0], [[1], [3]])
+        self.assertAllEqual(round_robin_segments[1], [[5], [6]])
+
+  def testPrecomputedRowLengths(self):
+    segments = [
+        ragged_factory_ops.constant([[1, 2, 3], [4]]),
+        ragged_factory_ops.constant([[5, 6], [7, 8, 9]]),
+    ]
+    row_lengths = trimmer_ops._compute_stacked_row_lengths(segments)
+    self.assertAllEqual(row_lengths, [[3, 2], [1, 3]])
+    for trimmer in (trimmer_ops.WaterfallTrimmer(3),
+                    trimmer_ops.RoundRobinTrimmer(3)):
+      expected = trimmer.generate_mask(segments)
+      actual = trimmer.generate_mask(
+          segments, _precomputed_row_lengths=row_lengths)
+      for expected_mask, actual_mask in zip(expected, actual):
+        self.assertAllEqual(expected_mask, actual_mask)
+
+  def testTrimBatchRequiresAllocate(self):
+
+    class PositiveValuesTrimmer(trimmer_ops.WaterfallTrimmer):
+
+      def generate_mask(self, segments):
+        return [s.with_values(s.values > 0) for s in segments]
+
+    segments = [ragged_factory_ops.constant([[1, 2], [3]])]
+    with self.assertRaises(NotImplementedError):
+      PositiveValuesTrimmer(1).trim_batch(segments, [1, 2])
+
+  @parameterized.parameters([
+      dict(budgets=[2, 5, 0]),
+      dict(budgets=[[2, 1], [3, 0]]),
+  ])
+  def testTrimBatch(self, budgets):
+    segments = [
+        ragged_factory_ops.constant([[1, 2, 3], [4]]),
+        ragged_factory_ops.constant([[5, 6], [7, 8, 9]]),
+    ]
+    trimmer = trimmer_ops.WaterfallTrimmer(0)
+    actual = trimmer.trim_batch(segments, budgets)
+    self.assertLen(actual, len(budgets))
+    for budget, actual_segments in zip(budgets, actual):
+      expected = trimmer_ops.WaterfallTrimmer(
+          constant_op.constant(budget)).trim(segments)
+      for expected_seg, actual_seg in zip(expected, actual_segments):
+        self.assertAllEqual(expected_seg, actual_seg)
+
 
 @test_util.run_all_in_graph_and_eager_modes
 class RoundRobinTrimmerOpsTest(test.TestCase, parameterized.TestCase):
@@ -234,6 +391,58 @@ class RoundRobinTrimmerOpsTest(test.TestCase, parameterized.TestCase):
           ],
           max_seq_length=2,
       ),
+      dict(
+          descr="Test per-batch budget of shape [batch]",
+          segments=[
+              # segment 1
+              [[1, 2, 3], [4, 5], [6]],
+              # segment 2
+              [[10], [20], [30, 40, 50]]
+          ],
+          expected=[
+              # segment 1
+              [[True, False, False], [True, False], [True]],
+              # Segment 2
+              [[True], [False], [True, True, False]]
+          ],
+          max_seq_length=[2, 1, 3],
+      ),
+      dict(
+          descr="Test per-batch budget of shape [batch, 1]",
+          segments=[
+              # segment 1
+              [[1, 2, 3], [4, 5], [6]],
+              # segment 2
+              [[10], [20], [30, 40, 50]]
+          ],
+          expected=[
+              # segment 1
+              [[True, False, False], [True, False], [True]],
+              # Segment 2
+              [[True], [False], [True, True, False]]
+          ],
+          max_seq_length=[[2], [1], [3]],
+      ),
+      dict(
+          descr="Test the budget is handed out in turns across segments",
+          segments=[
+              # segment 1
+              [[1, 2, 3], [4]],
+              # segment 2
+              [[10, 20, 30, 40], [50, 60]],
+              # segment 3
+              [[100, 200], [300, 400, 500]],
+          ],
+          expected=[
+              # segment 1
+              [[True, True, False], [True]],
+              # segment 2
+              [[True, True, False, False], [True, True]],
+              # segment 3
+              [[True, False], [True, True, False]],
+          ],
+          max_seq_length=5,
+      ),
       dict(
           descr="Basic test w/ segments of rank 3 on axis=-1",
           segments=[
@@ -380,6 +589,24 @@ class RoundRobinTrimmerOpsTest(test.TestCase, parameterized.TestCase):
     for expected_seg, actual_seg in zip(expected, actual):
       self.assertAllEqual(expected_seg, actual_seg)
 
+  @parameterized.parameters([
+      dict(budgets=[2, 5, 0]),
+      dict(budgets=[[2, 1], [3, 0]]),
+  ])
+  def testTrimBatch(self, budgets):
+    segments = [
+        ragged_factory_ops.constant([[1, 2, 3], [4]]),
+        ragged_factory_ops.constant([[5, 6], [7, 8, 9]]),
+    ]
+    trimmer = trimmer_ops.RoundRobinTrimmer(0)
+    actual = trimmer.trim_batch(segments, budgets)
+    self.assertLen(actual, len(budgets))
+    for budget, actual_segments in zip(budgets, actual):
+      expected = trimmer_ops.RoundRobinTrimmer(
+          constant_op.constant(budget)).trim(segments)
+      for expected_seg, actual_seg in zip(expected, actual_segments):
+        self.assertAllEqual(expected_seg, actual_seg)
+
 
 if __name__ == "__main__":
   test.main()